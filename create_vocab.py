@@ -1,77 +1,173 @@
 """ Create the vocabulary. The vocab is a dictionary containing the words
 and phrases as keys and their number of occurrences as values. Even if a
 word or phrase appears multiple times in a document, it is counted only
-once. This number illustrates how many documents contain a word/phrase. """
+once. This number illustrates how many documents contain a word/phrase.
+
+flair and NLTK are imported by the functions that need them, so that light
+utilities such as 'remove_ngrams' can be used without loading them. """
 
 
-import json
 from string import punctuation
 from collections import Counter
 import logging
 from time import time
 
-from flair.data import Sentence
-from flair.tokenization import SpacyTokenizer
-from flair.models import SequenceTagger
-from nltk.stem import WordNetLemmatizer
-from nltk.util import ngrams
-from nltk.corpus import stopwords, wordnet
+import storage
+
+
+# maps UPOS tags to the POS constants of NLTK's wordnet (wordnet.ADJ, etc.).
+wordnet_tags = {'ADJ': 'a', 'NOUN': 'n', 'VERB': 'v', 'ADV': 'r'}
 
 
 def create_vocab(data, tokenizer, tagger, lemmatizer,
-    processor=lambda x,y,z: x, max_ngrams=4):
+    processor=lambda x,y,z: x, max_ngrams=4, index=None):
+  """ Count the documents that contain each entry. If an InvertedIndex is
+  given, the entries of each document are added to it. """
   vocab = Counter()
   processed, total = 0, len(data)
   for record in data:
     processed += 1
-    phrases = []
-    if record['title'] is None:
-      if record['abstract'] is None:
-        logging.info(f"Empty record: {record['id']} - {processed}/{total}.")
-        continue
-      else:
-        text = record['abstract']
-    elif record['abstract'] is None:
-      text = record['title']
-    else:
-      if record['title'][-1] == '.':
-        text = f"{record['title']} {record['abstract']}"
-      else:
-        text = f"{record['title']}. {record['abstract']}"
-    tokens = processor(
-      Sentence(text, use_tokenizer=tokenizer),
-      tagger, lemmatizer
+    text = get_text(record)
+    if text is None:
+      logging.info(f"Empty record: {record['id']} - {processed}/{total}.")
+      continue
+    entries = get_entries(
+      text, tokenizer, tagger, lemmatizer, processor, max_ngrams
     )
-    for n in range(2, max_ngrams+1):
-      phrases += [' '.join(g) for g in ngrams(tokens, n)]
-    vocab.update(filter(tokens + phrases))
+    vocab.update(entries)
+    if index is not None:
+      index.add(record['id'], entries)
     logging.info(f"Processed {record['id']} - {processed}/{total}.")
   return vocab
 
 
+def create_vocab_batched(data, backend, max_ngrams=4, index=None,
+    batch_size=1000):
+  """ Same as 'create_vocab', but the texts are processed in batches by an
+  NLP backend of the module 'nlp_backends'. """
+  vocab = Counter()
+  records = [record for record in data if get_text(record) is not None]
+  logging.info(f'{len(data) - len(records)} records are empty.')
+  for start in range(0, len(records), batch_size):
+    batch = records[start:start+batch_size]
+    lemmas = backend.process([get_text(record) for record in batch])
+    for record, tokens in zip(batch, lemmas):
+      entries = get_ngrams(tokens, max_ngrams)
+      vocab.update(entries)
+      if index is not None:
+        index.add(record['id'], entries)
+    logging.info(f'Processed {start + len(batch)}/{len(records)} records.')
+  return vocab
+
+
+def update_vocab(vocab, removed, added, tokenizer, tagger, lemmatizer,
+    processor=lambda x,y,z: x, max_ngrams=4, index=None):
+  """ Update the counts of the vocab in place after some records were
+  removed, e.g. because they were deleted or changed, and some were added.
+  The entries of the removed records are computed again to be subtracted;
+  entries whose count drops to zero are removed from the vocab. If an
+  InvertedIndex is given, it is updated as well. """
+  for records, sign in ((removed, -1), (added, 1)):
+    for record in records:
+      text = get_text(record)
+      if text is None:
+        continue
+      entries = get_entries(
+        text, tokenizer, tagger, lemmatizer, processor, max_ngrams
+      )
+      update_counts(vocab, record['id'], entries, sign, index)
+  return vocab
+
+
+def update_vocab_batched(vocab, removed, added, backend, max_ngrams=4,
+    index=None, batch_size=1000):
+  """ Same as 'update_vocab', but the texts are processed in batches by an
+  NLP backend of the module 'nlp_backends'. """
+  for records, sign in ((removed, -1), (added, 1)):
+    records = [record for record in records if get_text(record) is not None]
+    for start in range(0, len(records), batch_size):
+      batch = records[start:start+batch_size]
+      lemmas = backend.process([get_text(record) for record in batch])
+      for record, tokens in zip(batch, lemmas):
+        entries = get_ngrams(tokens, max_ngrams)
+        update_counts(vocab, record['id'], entries, sign, index)
+  return vocab
+
+
+def update_counts(vocab, id, entries, sign, index=None):
+  """ Add (sign 1) or subtract (sign -1) the entries of a record to or from
+  the vocab and the inverted index. """
+  if index is not None:
+    if sign < 0 and id in index.numbers:
+      index.remove(id, entries)
+    elif sign > 0:
+      index.add(id, entries)
+  for entry in entries:
+    vocab[entry] = vocab.get(entry, 0) + sign
+    if vocab[entry] <= 0:
+      del vocab[entry]
+
+
+def get_text(record):
+  """ Return the title and the abstract of the record joined as a single
+  text, or None if the record has neither. """
+  if record['title'] is None:
+    return record['abstract']
+  elif record['abstract'] is None:
+    return record['title']
+  elif record['title'][-1] == '.':
+    return f"{record['title']} {record['abstract']}"
+  else:
+    return f"{record['title']}. {record['abstract']}"
+
+
+def get_entries(text, tokenizer, tagger, lemmatizer, processor, max_ngrams):
+  """ Return the distinct words and n-grams of the text that are kept in the
+  vocab. """
+  from flair.data import Sentence
+  tokens = processor(
+    Sentence(text, use_tokenizer=tokenizer),
+    tagger, lemmatizer
+  )
+  return get_ngrams(tokens, max_ngrams)
+
+
+def get_ngrams(tokens, max_ngrams):
+  """ Return the distinct tokens and n-grams of the processed tokens that
+  are kept in the vocab. """
+  from nltk.util import ngrams
+  phrases = []
+  for n in range(2, max_ngrams+1):
+    phrases += [' '.join(g) for g in ngrams(tokens, n)]
+  return filter(tokens + phrases)
+
+
 def process(sentence, tagger, lemmatizer):
   """ Given a Sentence object, lower-case and lemmatize the words. """
   tagger.predict(sentence)
-  tag_dict = {
-    'ADJ': wordnet.ADJ,
-    'NOUN': wordnet.NOUN,
-    'VERB': wordnet.VERB,
-    'ADV': wordnet.ADV
-  }
-  lemmas = []
-  for token in sentence:
-    if token.labels[0].value in tag_dict:
-      lemmas.append(lemmatizer.lemmatize(
-        token.text.lower(), tag_dict[token.labels[0].value])
-      )
-    else:
-      lemmas.append(token.text.lower())
-  return lemmas
+  return lemmatize(sentence, lemmatizer)
+
+
+def lemmatize(sentence, lemmatizer):
+  """ Given a tagged Sentence object, lower-case and lemmatize the words. """
+  return [
+    lemmatize_token(token.text, token.labels[0].value, lemmatizer)
+    for token in sentence
+  ]
+
+
+def lemmatize_token(text, tag, lemmatizer):
+  """ Lower-case the word and lemmatize it if its UPOS tag is an adjective,
+  a noun, a verb or an adverb. """
+  if tag in wordnet_tags:
+    return lemmatizer.lemmatize(text.lower(), wordnet_tags[tag])
+  return text.lower()
 
 
 def filter(phrases):
   """ Filter out phrases that contain a punctuation sign or single words
   that are a punctuation signs or stopwords. """
+  from nltk.corpus import stopwords
   filtered = []
   signs = ['!', '?', '.', ',']
   exclude = stopwords.words('english') + [c for c in punctuation]
@@ -88,12 +184,12 @@ def filter(phrases):
 
 def remove_ngrams(vocab_file, dump_file):
   """ Given a vocab, remove all entries that comprise more than one word. """
-  vocab = json.load(open(vocab_file))
+  vocab = storage.load_json(vocab_file)
   new_vocab = {}
   for entry in vocab:
     if ' ' not in entry:
       new_vocab[entry] = vocab[entry]
-  json.dump(new_vocab, open(dump_file, 'w'))
+  storage.dump_json(new_vocab, dump_file)
 
 
 if __name__ == "__main__":
@@ -103,7 +199,10 @@ if __name__ == "__main__":
   #   format='%(asctime)s %(message)s',
   #   level=logging.INFO
   # )
-  # data = json.load(open('data/json/dim/all/data.json'))
+  # from flair.tokenization import SpacyTokenizer
+  # from flair.models import SequenceTagger
+  # from nltk.stem import WordNetLemmatizer
+  # data = storage.load_json('data/json/dim/all/data.json')
   # tokenizer = SpacyTokenizer('en_core_web_sm')
   # lemmatizer = WordNetLemmatizer()
   # tagger = SequenceTagger.load('upos-fast')
@@ -113,7 +212,7 @@ if __name__ == "__main__":
   # logging.info('Using the upos-fast model of flair for POS-tagging.')
   # logging.info('Extracting N-grams of up to length 4.')
   # vocab = create_vocab(data, tokenizer, tagger, lemmatizer, process)
-  # json.dump(vocab, open(f'data/vocab/repo_vocab_{start}.json', 'w'))
+  # storage.dump_json(vocab, f'data/vocab/repo_vocab_{start}.json')
   remove_ngrams(
     'data/vocab/repo_vocab_step_1.json',
     'data/vocab/repo_vocab_1grams.json'
@@ -0,0 +1,125 @@
+""" Export the processed data as a sparse document-term matrix, whose columns
+are the entries of the final vocab and whose rows are the documents. The
+lemmas of each document, as computed by the DataProcessor, are matched against
+the vocab in a single pass: at each position, the n-grams of up to
+'max_ngrams' lemmas starting there are looked up in the mapping of entries to
+columns. Title and abstract are separated by a period, as in 'create_vocab',
+so that no n-gram spans both.
+
+The processed data is streamed from its file instead of being loaded at once,
+so that only the matrix is kept in memory. Its rows are built in chunks of
+documents, each stored as CSR arrays, and the matrix is dumped in the binary
+NPZ format of scipy together with a JSON file with the document IDs of the
+rows and the entries of the columns. """
+
+
+import logging
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+import storage
+
+
+class DocTermMatrix:
+  def __init__(self, vocab_file, max_ngrams=4):
+    vocab = storage.load_json(vocab_file)
+    self.entries = sorted(vocab)
+    self.columns = {entry: i for i, entry in enumerate(self.entries)}
+    self.max_ngrams = max_ngrams
+
+  def count(self, lemmas):
+    """ Return a dict mapping the columns of the entries found in the list of
+    lemmas to their number of occurrences. """
+    counts = {}
+    for i in range(len(lemmas)):
+      for n in range(1, min(self.max_ngrams, len(lemmas)-i) + 1):
+        column = self.columns.get(' '.join(lemmas[i:i+n]))
+        if column is not None:
+          counts[column] = counts.get(column, 0) + 1
+    return counts
+
+  def build(self, items, chunk_size=10000):
+    """ Return the IDs of the documents and the CSR matrix of their entry
+    counts. 'items' yields the IDs with their processed title and abstract,
+    e.g. 'storage.iter_json_items' on the processed data. """
+    ids, chunks = [], []
+    indptr, indices, values = array('q', [0]), array('i'), array('i')
+    for id, texts in items:
+      lemmas = []
+      for text in ('title', 'abstract'):
+        if texts[text] is not None:
+          if len(lemmas) > 0:
+            lemmas.append('.')
+          lemmas += texts[text]
+      counts = self.count(lemmas)
+      for column in sorted(counts):
+        indices.append(column)
+        values.append(counts[column])
+      indptr.append(len(indices))
+      ids.append(id)
+      if len(ids) % chunk_size == 0:
+        chunks.append(self.to_csr(indptr, indices, values))
+        indptr, indices, values = array('q', [0]), array('i'), array('i')
+        logging.info(f'Processed {len(ids)} documents.')
+    if len(indptr) > 1 or len(chunks) == 0:
+      chunks.append(self.to_csr(indptr, indices, values))
+    return ids, sparse.vstack(chunks, format='csr')
+
+  def to_csr(self, indptr, indices, values):
+    """ Return the CSR matrix of a chunk of documents. """
+    return sparse.csr_matrix(
+      (
+        np.frombuffer(values, dtype=np.int32),
+        np.frombuffer(indices, dtype=np.int32),
+        np.frombuffer(indptr, dtype=np.int64)
+      ),
+      shape=(len(indptr)-1, len(self.entries))
+    )
+
+  def dump(self, ids, matrix, root):
+    """ Dump the matrix to '{root}.npz' and its rows and columns to
+    '{root}.json'. """
+    sparse.save_npz(f'{root}.npz', matrix)
+    storage.dump_json({'rows': ids, 'columns': self.entries}, f'{root}.json')
+
+
+def tfidf(counts):
+  """ Return the TF-IDF matrix of the CSR count matrix. The IDF is smoothed as
+  if an extra document contained every entry, and rows are L2-normalized. """
+  n_docs = counts.shape[0]
+  df = np.bincount(counts.indices, minlength=counts.shape[1])
+  idf = np.log((1 + n_docs) / (1 + df)) + 1
+  weights = counts.astype(np.float64).multiply(idf).tocsr()
+  norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+  norms[norms == 0] = 1
+  return sparse.diags(1 / norms).dot(weights).tocsr()
+
+
+def load(root):
+  """ Return the rows, the columns and the matrix dumped with the given
+  root name. """
+  meta = storage.load_json(f'{root}.json')
+  return meta['rows'], meta['columns'], sparse.load_npz(f'{root}.npz')
+
+
+def export(vocab_file, data_file, root, max_ngrams=4):
+  """ Dump the count and TF-IDF matrices of the processed data. """
+  matrix = DocTermMatrix(vocab_file, max_ngrams)
+  ids, counts = matrix.build(storage.iter_json_items(data_file))
+  matrix.dump(ids, counts, f'{root}_counts')
+  matrix.dump(ids, tfidf(counts), f'{root}_tfidf')
+
+
+if __name__ == '__main__':
+  logging.basicConfig(
+    filename='logs/doc_term_matrix.log',
+    format='%(asctime)s %(message)s',
+    level=logging.INFO
+  )
+  export(
+    'data/vocab/repo_vocab_step_4.json',
+    'data/json/dim/all/data_lemmas.json',
+    'data/vocab/doc_term'
+  )
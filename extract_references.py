@@ -4,7 +4,6 @@ which extracts the references.  """
 
 
 import xml.etree.ElementTree as ET
-import json
 import os
 import logging
 from time import time
@@ -14,6 +13,8 @@ import requests
 from refextract import extract_references_from_string
 from tika import parser
 
+import storage
+
 
 oai = '{http://www.openarchives.org/OAI/2.0/}'
 didl = '{urn:mpeg:mpeg21:2002:02-DIDL-NS}'
@@ -31,13 +32,13 @@ def extract_refs(funcs):
   for repo in ['depositonce', 'edoc', 'refubium']:
     logging.info(f'Starting with repo {repo}')
     res = {}
-    ids = json.load(open(f'data/json/dim/{repo}/relevant_ids.json'))
+    ids = storage.load_json(f'data/json/dim/{repo}/relevant_ids.json')
     for id in ids:
       filename = funcs[repo](base_urls[repo], id)
       if filename is not None:
         if parse_pdf(filename):
           res[id] = get_references(filename)
-    json.dump(res, open(f'data/json/references/{repo}.json', 'w'))
+    storage.dump_json(res, f'data/json/references/{repo}.json')
 
 
 def extract_missing_refs(missing, funcs):
@@ -48,7 +49,7 @@ def extract_missing_refs(missing, funcs):
       if filename is not None:
         if parse_pdf(filename):
           res[id] = get_references(filename)
-  json.dump(res, open(f'data/json/references/missing_references.json', 'w'))
+  storage.dump_json(res, f'data/json/references/missing_references.json')
 
 
 def get_didl_pdf(base_url, id):
@@ -123,5 +124,5 @@ if __name__ == '__main__':
     'edoc': get_didl_pdf,
     'refubium': get_xoai_pdf
   }
-  missing = json.load(open('data/json/references/missing.json'))
+  missing = storage.load_json('data/json/references/missing.json')
   extract_missing_refs(missing, pdf_retrieval_funcs)
\ No newline at end of file
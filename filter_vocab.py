@@ -16,12 +16,13 @@ terms of strings. The latter would remove 'selling' because it matches with
 'counselling'. """
 
 
-import json
 import logging
 from time import time
 from multiprocessing import Pool
 from sys import getsizeof
 
+import storage
+
 
 class VocabFilterer:
   def __init__(self, vocab_file, bottom=1, top=1000):
@@ -31,7 +32,7 @@ class VocabFilterer:
       level=logging.INFO
     )
     self.root_name = vocab_file[:-5]
-    self.vocab = json.load(open(vocab_file))
+    self.vocab = storage.load_json(vocab_file)
     self.remove = []  # stores the entries to be removed in each step.
     self.bottom = bottom
     self.top = top
@@ -157,10 +158,7 @@ class VocabFilterer:
   def dump(self, obj, appendix):
     """ Dump the JSON object 'obj' with the root name plus the appendix
     as the name."""
-    json.dump(
-      obj, 
-      open(f'{self.root_name}{appendix}.json', 'w', encoding='utf-8')
-    )
+    storage.dump_json(obj, f'{self.root_name}{appendix}.json')
 
 
 def is_included(included, includes):
@@ -191,11 +189,11 @@ def remove(arr, idx):
 def keep_1grams(filename):
   """ Remove all n-grams. """
   new_vocab = {}
-  vocab = json.load(open(filename, encoding='utf-8'))
+  vocab = storage.load_json(filename)
   for entry, cnt in vocab.items():
     if ' ' not in entry:
       new_vocab[entry] = cnt
-  json.dump(new_vocab, open(filename, 'w', encoding='utf-8'))
+  storage.dump_json(new_vocab, filename)
 
 if __name__ == "__main__":
   filename = 'data/vocab/repo_vocab_step_4.json'
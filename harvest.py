@@ -0,0 +1,187 @@
+""" Harvest the repositories incrementally with OAI-PMH. For each repository,
+the datestamp of the latest harvested record is stored as a high-water mark;
+the next harvest only requests the records that were added, changed or deleted
+since then with the 'from' argument, following the resumption tokens until all
+pages are retrieved. Before the first harvest, the mark is the latest datestamp
+of the pages already stored, i.e. of the initial dump. The pages are stored
+next to the initial dump in data/xml/dim, where the DataLoader picks the
+latest version of each record.
+
+The harvest returns the IDs of the new or changed records and of the deleted
+ones, which are used to update the data and the vocab in place instead of
+recomputing them. The base URLs can be replaced, e.g. with
+the URL of a local stand-in server to test the harvester. """
+
+
+import logging
+from time import time
+from xml.etree import ElementTree as ET
+
+import requests
+
+import storage
+from load_data import DataLoader
+
+
+oai = '{http://www.openarchives.org/OAI/2.0/}'
+base_urls = {
+  'depositonce': 'https://depositonce.tu-berlin.de/oai/request',
+  'edoc': 'https://edoc.hu-berlin.de/oai/request',
+  'refubium': 'https://refubium.fu-berlin.de/oai/request'
+}
+
+
+class Harvester:
+  def __init__(self, base_urls=base_urls, folder='data/xml/dim',
+      state_file='data/json/dim/harvest_state.json', prefix='dim',
+      timeout=60):
+    self.base_urls = base_urls
+    self.folder = folder
+    self.state_file = state_file
+    self.prefix = prefix
+    self.timeout = timeout
+    if storage.exists(state_file):
+      self.state = storage.load_json(state_file)
+    else:
+      self.state = {}
+
+  def harvest_all(self):
+    """ Harvest all repositories. Return a dict mapping each repo to the
+    files that were stored and the changed and deleted IDs. """
+    return {repo: self.harvest(repo) for repo in self.base_urls}
+
+  def harvest(self, repo):
+    """ Harvest the records of the repo that changed since the last harvest
+    and store each page in the repo's folder. The high-water mark is only
+    updated once all pages were retrieved, so that an interrupted harvest is
+    repeated. Return the stored files and the changed and deleted IDs. """
+    params = {'verb': 'ListRecords', 'metadataPrefix': self.prefix}
+    high_water_mark = self.state.get(repo)
+    if high_water_mark is None:
+      high_water_mark = self.latest_datestamp(repo)
+    if high_water_mark is not None:
+      params['from'] = self.format_datestamp(repo, high_water_mark)
+    logging.info(f'Harvesting {repo} from {params.get("from")}.')
+    started, files, latest = int(time()), [], {}
+    while storage.exists(f'{self.folder}/{repo}/harvest_{started}_0.xml'):
+      started += 1
+    while True:
+      content = self.request(repo, params)
+      root = ET.fromstring(content)
+      error = root.find(f'{oai}error')
+      if error is not None:
+        if error.attrib.get('code') == 'noRecordsMatch':
+          break
+        raise ValueError(f'{repo} returned an error: {error.text}')
+      file = f'{self.folder}/{repo}/harvest_{started}_{len(files)}.xml'
+      storage.write_bytes(file, content)
+      files.append(file)
+      records = root.find(f'{oai}ListRecords')
+      for header in records.iter(f'{oai}header'):
+        id = header.find(f'{oai}identifier').text
+        datestamp = header.find(f'{oai}datestamp').text
+        deleted = header.attrib.get('status') == 'deleted'
+        if id not in latest or latest[id][0] <= datestamp:
+          latest[id] = (datestamp, deleted)
+      token = records.find(f'{oai}resumptionToken')
+      if token is None or not token.text:
+        break
+      params = {'verb': 'ListRecords', 'resumptionToken': token.text}
+    datestamps = [datestamp for datestamp, _ in latest.values()]
+    if high_water_mark is not None:
+      datestamps.append(high_water_mark)
+    if len(datestamps) > 0 and self.state.get(repo) != max(datestamps):
+      self.state[repo] = max(datestamps)
+      storage.dump_json(self.state, self.state_file)
+    delta = {
+      'files': files,
+      'changed': [id for id, (_, deleted) in latest.items() if not deleted],
+      'deleted': [id for id, (_, deleted) in latest.items() if deleted]
+    }
+    logging.info(
+      f'{repo}: {len(files)} pages, {len(delta["changed"])} new or changed '
+      f'and {len(delta["deleted"])} deleted records.'
+    )
+    return delta
+
+  def latest_datestamp(self, repo):
+    """ Return the latest datestamp of the pages already stored for the repo,
+    e.g. the initial dump, or None if there are none. It is used as the
+    high-water mark of the first harvest, so that the stored records are not
+    harvested again. """
+    loader, latest = DataLoader(), None
+    loader.folder = self.folder
+    for file in loader.files(repo):
+      for _, datestamp, _ in loader.iter_records(file):
+        if latest is None or datestamp > latest:
+          latest = datestamp
+    return latest
+
+  def request(self, repo, params):
+    """ Send an OAI-PMH request to the repo and return the response. """
+    res = requests.get(self.base_urls[repo], params, timeout=self.timeout)
+    res.raise_for_status()
+    return res.content
+
+  def format_datestamp(self, repo, datestamp):
+    """ Return the datestamp with the granularity supported by the repo, as
+    stated in its response to the 'Identify' verb. The 'from' argument is
+    inclusive: the records with the high-water mark as datestamp are
+    harvested again, but none is missed. """
+    root = ET.fromstring(self.request(repo, {'verb': 'Identify'}))
+    granularity = root.find(f'{oai}Identify/{oai}granularity')
+    if granularity is not None and granularity.text == 'YYYY-MM-DD':
+      return datestamp[:10]
+    return datestamp
+
+
+def apply_delta(delta,
+    unmatched_file='data/json/dim/all/unmatched_ids.json'):
+  """ Update the data, the vocab and its inverted index in place with the
+  harvested changes. The files, the models and the NLP backend are those of
+  the 'vocab' stage of the pipeline, with the parameters it was last run
+  with, so that the updated counts match the existing ones. The 'data' and
+  'vocab' stages are then marked as up to date, so that only the downstream
+  stages are recomputed. The processed data of the 'lemmas' stage is built
+  from 'improved_data.json', which the harvest does not update, and is left
+  as is. The IDs of the harvested records that are not in the relevant IDs,
+  e.g. newly deposited ones, are added to the unmatched file, so that they
+  can be classified. """
+  from load_data import update_data
+  from create_vocab import update_vocab_batched
+  from inverted_index import InvertedIndex
+  import pipeline
+  runner = pipeline.Runner(pipeline.stages)
+  params = runner.last_params('vocab')
+  removed, added, unmatched = update_data(params['data_file'], delta)
+  logging.info(f'{len(removed)} records removed, {len(added)} added.')
+  if storage.exists(unmatched_file):
+    unmatched = set(unmatched) | set(storage.load_json(unmatched_file))
+  storage.dump_json(sorted(unmatched), unmatched_file)
+  vocab = storage.load_json(params['dump_file'])
+  index_file = params.get('index_file')
+  index = InvertedIndex.load(index_file) if index_file is not None else None
+  backend = pipeline.vocab_backend(
+    params['backend'], params['model'], params['tagger'],
+    params.get('n_process', 1)
+  )
+  update_vocab_batched(
+    vocab, removed, added, backend, params['max_ngrams'], index
+  )
+  storage.dump_json(vocab, params['dump_file'])
+  if index is not None:
+    index.dump(index_file)
+  runner.stages['vocab'].params = params
+  runner.mark_done(['data', 'vocab'])
+
+
+if __name__ == '__main__':
+  logging.basicConfig(
+    filename=f'logs/harvest_{int(time())}.log',
+    format='%(asctime)s %(message)s',
+    level=logging.INFO
+  )
+  harvester = Harvester()
+  delta = harvester.harvest_all()
+  storage.dump_json(delta, 'data/json/dim/all/delta.json')
+  apply_delta(delta)
@@ -0,0 +1,158 @@
+""" Inverted index from the vocab entries to the documents that contain them.
+It is built alongside the vocab by 'create_vocab' and allows to look up which
+documents use a word or phrase without processing the corpus again.
+
+Documents are numbered in the order in which they are added, so that the
+posting list of each entry is sorted. Posting lists are stored compressed: the
+differences between consecutive document numbers are encoded as varints, which
+takes a single byte for most gaps. The index is dumped as two files: a binary
+file with the concatenated postings and a JSON file with the document IDs and,
+for each entry, the offset and length of its postings and its frequency. """
+
+
+import storage
+
+
+class InvertedIndex:
+  def __init__(self):
+    self.docs = []  # document IDs by number; None if the doc was removed.
+    self.numbers = {}  # maps the document IDs to their numbers.
+    self.entries = {}  # maps the entries to their compressed postings.
+    self.frequencies = {}  # maps the entries to their document frequency.
+    self.buffer = {}  # postings added since the last compression.
+
+  def add(self, doc_id, entries):
+    """ Add a document and the distinct entries it contains. A document that
+    is already indexed must be removed first, with the entries it contained,
+    as the index does not store the entries of each document. """
+    if doc_id in self.numbers:
+      raise ValueError(f'Document "{doc_id}" is already indexed.')
+    number = len(self.docs)
+    self.docs.append(doc_id)
+    self.numbers[doc_id] = number
+    for entry in entries:
+      if entry in self.buffer:
+        self.buffer[entry].append(number)
+      else:
+        self.buffer[entry] = [number]
+      self.frequencies[entry] = self.frequencies.get(entry, 0) + 1
+
+  def remove(self, doc_id, entries):
+    """ Remove a document from the postings of the given entries, which are
+    the ones it contains. """
+    number = self.numbers.pop(doc_id)
+    self.docs[number] = None
+    self.compress()
+    for entry in entries:
+      postings = [n for n in self.postings(entry) if n != number]
+      if len(postings) == 0:
+        self.entries.pop(entry, None)
+        self.frequencies.pop(entry, None)
+      else:
+        self.entries[entry] = encode(postings)
+        self.frequencies[entry] = len(postings)
+
+  def compress(self):
+    """ Move the buffered postings to the compressed ones. """
+    for entry, numbers in self.buffer.items():
+      if entry in self.entries:
+        numbers = decode(self.entries[entry]) + numbers
+      self.entries[entry] = encode(numbers)
+    self.buffer = {}
+
+  def postings(self, entry):
+    """ Return the sorted document numbers of the entry. """
+    postings = decode(self.entries[entry]) if entry in self.entries else []
+    return postings + self.buffer.get(entry, [])
+
+  def lookup(self, entry):
+    """ Return the IDs of the documents that contain the entry. """
+    return [self.docs[n] for n in self.postings(entry)]
+
+  def intersection(self, entries):
+    """ Return the IDs of the documents that contain all the entries. The
+    postings are intersected starting with the least frequent entry. """
+    entries = sorted(entries, key=lambda e: self.frequencies.get(e, 0))
+    if len(entries) == 0 or entries[0] not in self.frequencies:
+      return []
+    numbers = set(self.postings(entries[0]))
+    for entry in entries[1:]:
+      numbers.intersection_update(self.postings(entry))
+      if len(numbers) == 0:
+        break
+    return [self.docs[n] for n in sorted(numbers)]
+
+  def union(self, entries):
+    """ Return the IDs of the documents that contain any of the entries. """
+    numbers = set()
+    for entry in entries:
+      numbers.update(self.postings(entry))
+    return [self.docs[n] for n in sorted(numbers)]
+
+  def count(self, entries=None, doc_ids=None):
+    """ Return the document frequency of the given entries, e.g. those that
+    remain after filtering the vocab, as a dict. Without entries, all of them
+    are counted. If 'doc_ids' is given, only these documents are counted. """
+    if entries is None:
+      entries = self.frequencies.keys()
+    if doc_ids is None:
+      return {e: self.frequencies[e] for e in entries if e in self.frequencies}
+    numbers = {self.numbers[id] for id in doc_ids if id in self.numbers}
+    counts = {}
+    for entry in entries:
+      cnt = sum(1 for n in self.postings(entry) if n in numbers)
+      if cnt > 0:
+        counts[entry] = cnt
+    return counts
+
+  def dump(self, root):
+    """ Dump the index to the files '{root}.bin' and '{root}.json'. """
+    self.compress()
+    entries, offset = {}, 0
+    with open(f'{root}.bin', 'wb') as f:
+      for entry, postings in self.entries.items():
+        f.write(postings)
+        entries[entry] = [offset, len(postings), self.frequencies[entry]]
+        offset += len(postings)
+    storage.dump_json({'docs': self.docs, 'entries': entries}, f'{root}.json')
+
+  @classmethod
+  def load(cls, root):
+    """ Load the index dumped with the given root name. """
+    index = cls()
+    meta = storage.load_json(f'{root}.json')
+    with open(f'{root}.bin', 'rb') as f:
+      postings = f.read()
+    index.docs = meta['docs']
+    index.numbers = {id: n for n, id in enumerate(index.docs) if id is not None}
+    for entry, (offset, length, freq) in meta['entries'].items():
+      index.entries[entry] = postings[offset:offset+length]
+      index.frequencies[entry] = freq
+    return index
+
+
+def encode(numbers):
+  """ Encode the sorted numbers as the varints of their differences. """
+  res, previous = bytearray(), 0
+  for number in numbers:
+    gap = number - previous
+    previous = number
+    while gap >= 0x80:
+      res.append(gap & 0x7f | 0x80)
+      gap >>= 7
+    res.append(gap)
+  return bytes(res)
+
+
+def decode(data):
+  """ Decode the varints of the differences back to the sorted numbers. """
+  numbers, number, gap, shift = [], 0, 0, 0
+  for byte in data:
+    gap |= (byte & 0x7f) << shift
+    if byte & 0x80:
+      shift += 7
+    else:
+      number += gap
+      numbers.append(number)
+      gap, shift = 0, 0
+  return numbers
@@ -2,12 +2,11 @@
 in data/json/dim/all/relevant_ids.json and the metadata is in data/xml/dim. """
 
 
-import os
-import json
-from xml.etree import ElementTree as ET
 from string import Template
 import logging
 
+import storage
+
 
 oai = '{http://www.openarchives.org/OAI/2.0/}'
 oai_dc = '{http://www.openarchives.org/OAI/2.0/oai_dc/}'
@@ -23,20 +22,59 @@ class DataLoader:
   
   def load_data(self):
     """ Iterate over the files. Yield the records whose IDs are in the list
-    of relevant IDs. """
+    of relevant IDs. Incremental harvests may store several versions of a
+    record; only the one with the latest datestamp is yielded, and none if
+    it was deleted. """
     for repo in self.repos:
-      ids = json.load(open(self.ids_template.substitute(repo=repo)))
-      for filename in os.listdir(f'{self.folder}/{repo}'):
-        root = ET.parse(f'{self.folder}/{repo}/{filename}').getroot()
-        for record in root.find(f'{oai}ListRecords'):
-          header = record.find(f'{oai}header')
-          if record.tag == f'{oai}resumptionToken' or 'status' in \
-              header.attrib and header.attrib['status'] == 'deleted':
-            continue
-          id = header.find(f'{oai}identifier').text
-          if id in ids:
-            yield self.process(id, record.find(f'{oai}metadata').find(f'{dim}dim'))
-  
+      ids = storage.load_json(self.ids_template.substitute(repo=repo))
+      for record in self.load_files(self.files(repo), ids).values():
+        if record is not None:
+          yield record
+
+  def files(self, repo):
+    """ Return the paths of the XML files of the repo. """
+    folder = f'{self.folder}/{repo}'
+    return [f'{folder}/{filename}' for filename in storage.list_files(folder)]
+
+  def load_files(self, files, ids):
+    """ Return a dict mapping the IDs of the relevant records found in the
+    given files to their latest version, or to None if it was deleted. """
+    return {
+      id: None if record is None else self.process(
+        id, record.find(f'{oai}metadata').find(f'{dim}dim')
+      )
+      for id, record in self.latest_records(files, ids).items()
+    }
+
+  def latest_records(self, files, ids=None):
+    """ Return a dict mapping the IDs of the records found in the given files
+    to the XML element of their latest version, or to None if it was
+    deleted. If 'ids' is given, only these records are included. """
+    latest = {}
+    ids = set(ids) if ids is not None else None
+    for file in files:
+      for id, datestamp, record in self.iter_records(file):
+        if ids is not None and id not in ids:
+          continue
+        if id not in latest or latest[id][0] <= datestamp:
+          latest[id] = (datestamp, record)
+    return {id: record for id, (_, record) in latest.items()}
+
+  def iter_records(self, file):
+    """ Yield the ID, the datestamp and the XML element of each record in the
+    file. The element of deleted records is None. """
+    root = storage.parse_xml(file).getroot()
+    for record in root.find(f'{oai}ListRecords'):
+      if record.tag == f'{oai}resumptionToken':
+        continue
+      header = record.find(f'{oai}header')
+      id = header.find(f'{oai}identifier').text
+      datestamp = header.find(f'{oai}datestamp').text
+      if 'status' in header.attrib and header.attrib['status'] == 'deleted':
+        yield id, datestamp, None
+      else:
+        yield id, datestamp, record
+
   def process(self, id, metadata):
     """ Return the id, title and abstract of the record as a tuple. """
     title, abstract = None, None
@@ -86,7 +124,43 @@ def save_data(dump_file):
   for id, title, abstract in loader.load_data():
     if not (title is None and abstract is None):
       data.append({'id': id, 'title': title, 'abstract': abstract})
-  json.dump(data, open(dump_file, 'w'))
+  storage.dump_json(data, dump_file)
+
+def update_data(data_file, delta):
+  """ Update the data file in place with the records harvested incrementally.
+  'delta' maps each repo to the harvested files and the changed and deleted
+  IDs, as returned by 'harvest.Harvester.harvest_all'. Only the records in
+  the lists of relevant IDs are considered. Return the records that were
+  removed or replaced and the ones that were added, so that the artifacts
+  computed from the data can be updated as well, and the IDs of the
+  harvested records that are not in the lists, e.g. newly deposited ones,
+  which have to be classified first. """
+  data = {record['id']: record for record in storage.load_json(data_file)}
+  removed, added, unmatched = [], [], []
+  loader = DataLoader()
+  for repo, changes in delta.items():
+    ids = storage.load_json(loader.ids_template.substitute(repo=repo))
+    records = loader.load_files(changes['files'], ids)
+    unmatched += [id for id in changes['changed'] if id not in records]
+    for id in set(changes['changed'] + changes['deleted']):
+      record = None
+      if records.get(id) is not None:
+        id, title, abstract = records[id]
+        if not (title is None and abstract is None):
+          record = {'id': id, 'title': title, 'abstract': abstract}
+      if record is not None and record == data.get(id):
+        continue  # harvested again, but unchanged.
+      if id in data:
+        removed.append(data.pop(id))
+      if record is not None:
+        data[id] = record
+        added.append(record)
+  storage.dump_json(list(data.values()), data_file)
+  if len(unmatched) > 0:
+    logging.warning(
+      f'{len(unmatched)} harvested records are not in the relevant IDs.'
+    )
+  return removed, added, unmatched
 
 if __name__ == "__main__":
   save_data('data/json/dim/all/data.json')
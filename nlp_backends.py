@@ -0,0 +1,145 @@
+""" Backends for the tokenize -> POS-tag -> lemmatize step. Each backend
+processes a batch of texts and returns, for each text, its tokens with their
+UPOS tag and lower-cased lemma ('analyse') or only the lemmas ('process').
+
+- 'flair' is the original pipeline: spaCy tokenizer, flair tagger and the
+  WordNet lemmatizer of NLTK, with the tagger predicting whole batches.
+- 'spacy' uses spaCy's own tagger, with 'nlp.pipe' running on several
+  processes. The lemmas are either spaCy's or, to isolate the effect of the
+  tagger, those of the WordNet lemmatizer given spaCy's tags.
+
+Running this module compares the backends on a sample of the corpus: it logs
+and dumps their throughput and how often they agree on the tags and lemmas of
+the tokens. The 'vocab' stage of the pipeline runs the same backends, so the
+measured throughput is the one of the stage. """
+
+
+import random
+import logging
+from time import time, perf_counter
+
+import storage
+from create_vocab import get_text, lemmatize, lemmatize_token
+
+
+class FlairBackend:
+  def __init__(self, model='en_core_web_sm', tagger='upos-fast',
+      batch_size=32):
+    from process_data import load_models
+    self.tokenizer, self.tagger, self.lemmatizer = load_models(model, tagger)
+    self.batch_size = batch_size
+
+  def analyse(self, texts):
+    from flair.data import Sentence
+    sentences = [Sentence(text, use_tokenizer=self.tokenizer) for text in texts]
+    self.tagger.predict(sentences, mini_batch_size=self.batch_size)
+    res = []
+    for sentence in sentences:
+      lemmas = lemmatize(sentence, self.lemmatizer)
+      res.append([
+        (token.text, token.labels[0].value, lemma)
+        for token, lemma in zip(sentence, lemmas)
+      ])
+    return res
+
+  def process(self, texts):
+    return [[lemma for _, _, lemma in doc] for doc in self.analyse(texts)]
+
+
+class SpacyBackend:
+  def __init__(self, model='en_core_web_sm', n_process=1, batch_size=256,
+      lemmatizer='spacy'):
+    import spacy
+    self.nlp = spacy.load(model, disable=['parser', 'ner'])
+    self.n_process = n_process
+    self.batch_size = batch_size
+    if lemmatizer == 'wordnet':
+      from nltk.stem import WordNetLemmatizer
+      self.lemmatizer = WordNetLemmatizer()
+    elif lemmatizer == 'spacy':
+      self.lemmatizer = None
+    else:
+      raise ValueError(f'Unknown lemmatizer "{lemmatizer}".')
+
+  def analyse(self, texts):
+    res = []
+    docs = self.nlp.pipe(
+      texts, n_process=self.n_process, batch_size=self.batch_size
+    )
+    for doc in docs:
+      if self.lemmatizer is None:
+        res.append([(t.text, t.pos_, t.lemma_.lower()) for t in doc])
+      else:
+        res.append([
+          (t.text, t.pos_, lemmatize_token(t.text, t.pos_, self.lemmatizer))
+          for t in doc
+        ])
+    return res
+
+  def process(self, texts):
+    return [[lemma for _, _, lemma in doc] for doc in self.analyse(texts)]
+
+
+backends = {'flair': FlairBackend, 'spacy': SpacyBackend}
+
+
+def get_backend(name, **kwargs):
+  """ Return the backend with the given name, initialized with the keyword
+  arguments. """
+  if name not in backends:
+    raise ValueError(f'Unknown backend "{name}".')
+  return backends[name](**kwargs)
+
+
+def compare(texts, backends, reference='flair'):
+  """ Process the texts with each backend and return, for each one, its
+  throughput and its agreement with the reference backend. Tags and lemmas
+  are only compared in texts that both backends split into the same
+  tokens. """
+  results, analyses = {}, {}
+  for name, backend in backends.items():
+    start = perf_counter()
+    analyses[name] = backend.analyse(texts)
+    duration = perf_counter() - start
+    n_tokens = sum(len(doc) for doc in analyses[name])
+    results[name] = {
+      'seconds': duration,
+      'docs_per_second': len(texts) / duration,
+      'tokens_per_second': n_tokens / duration
+    }
+    logging.info(f'{name}: {results[name]}')
+  for name in backends:
+    if name == reference:
+      continue
+    aligned, tokens, same_tags, same_lemmas = 0, 0, 0, 0
+    for ref_doc, doc in zip(analyses[reference], analyses[name]):
+      if [t[0] for t in ref_doc] != [t[0] for t in doc]:
+        continue
+      aligned += 1
+      tokens += len(doc)
+      same_tags += sum(1 for a, b in zip(ref_doc, doc) if a[1] == b[1])
+      same_lemmas += sum(1 for a, b in zip(ref_doc, doc) if a[2] == b[2])
+    results[name]['aligned_docs'] = aligned / len(texts)
+    results[name]['tag_agreement'] = same_tags / max(tokens, 1)
+    results[name]['lemma_agreement'] = same_lemmas / max(tokens, 1)
+    logging.info(f'{name} agreement with {reference}: {results[name]}')
+  return results
+
+
+if __name__ == '__main__':
+  start = int(time())
+  logging.basicConfig(
+    filename=f'logs/nlp_backends_{start}.log',
+    format='%(asctime)s %(message)s',
+    level=logging.INFO
+  )
+  data = storage.load_json('data/json/dim/all/data.json')
+  random.seed(0)
+  sample = random.sample(data, 1000)
+  texts = [get_text(r) for r in sample if get_text(r) is not None]
+  results = compare(texts, {
+    'flair': get_backend('flair'),
+    'spacy': get_backend('spacy', n_process=4),
+    'spacy_wordnet': get_backend('spacy', n_process=4, lemmatizer='wordnet')
+  })
+  storage.dump_json(results, f'data/vocab/backends_{start}.json', indent=2)
@@ -0,0 +1,142 @@
+""" Long-lived worker that keeps the NLP models loaded. Loading the spaCy
+tokenizer and the flair tagger takes tens of seconds; short jobs and notebooks
+can instead send their texts to this worker over a local socket. Start it with
+'python nlp_worker.py' and use an NLPClient, which offers the same
+'process_text' and 'tokenize_text' methods as the DataProcessor, e.g.
+
+  client = NLPClient()
+  lemmas = client.process(['First text.', 'Second text.'])
+  process_subjects(client)
+
+Requests are batched: the tagger predicts all the sentences of a request at
+once. Connections are served in separate threads, but the models are used by
+one request at a time.
+
+The connections are authenticated with a key that the worker generates when
+it starts and writes to a file only readable by its user, from which the
+client reads it. The connection unpickles the requests, so the key must not be
+shared. """
+
+
+import os
+import logging
+from threading import Thread, Lock
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+
+address = ('localhost', 6000)
+key_file = os.path.expanduser('~/.nlp_worker_key')
+
+
+class NLPWorker:
+  def __init__(self, model='en_core_web_sm', tagger='upos-fast',
+      batch_size=32):
+    from process_data import load_models
+    self.tokenizer, self.tagger, self.lemmatizer = load_models(model, tagger)
+    self.batch_size = batch_size
+    self.lock = Lock()
+
+  def serve(self, address=address, key_file=key_file):
+    """ Accept connections until the process is stopped. A new key is
+    written to the key file, which is removed when the worker stops. """
+    authkey = os.urandom(32)
+    if os.path.exists(key_file):
+      os.remove(key_file)
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+      f.write(authkey)
+    try:
+      with Listener(address, authkey=authkey) as listener:
+        logging.info(f'NLP worker listening on {address}.')
+        while True:
+          try:
+            conn = listener.accept()
+          except AuthenticationError:
+            logging.warning('Rejected a connection with a wrong key.')
+            continue
+          Thread(target=self.handle, args=(conn,), daemon=True).start()
+    finally:
+      os.remove(key_file)
+
+  def handle(self, conn):
+    """ Answer the requests of a connection until it is closed. Each request
+    is a tuple with the name of a method and a list of texts; the response is
+    a tuple with a status and the result or the error message. """
+    with conn:
+      while True:
+        try:
+          method, texts = conn.recv()
+        except EOFError:
+          return
+        try:
+          if method not in ('tokenize', 'tag', 'process'):
+            raise ValueError(f'Unknown method "{method}".')
+          with self.lock:
+            conn.send(('ok', getattr(self, method)(texts)))
+        except Exception as exc:
+          logging.error(exc)
+          conn.send(('error', str(exc)))
+
+  def sentences(self, texts):
+    from flair.data import Sentence
+    return [Sentence(text, use_tokenizer=self.tokenizer) for text in texts]
+
+  def tokenize(self, texts):
+    """ Return the tokens of each text. """
+    return [[t.text for t in sentence] for sentence in self.sentences(texts)]
+
+  def tag(self, texts):
+    """ Return the tokens of each text with their POS tags. """
+    sentences = self.sentences(texts)
+    self.tagger.predict(sentences, mini_batch_size=self.batch_size)
+    return [[(t.text, t.labels[0].value) for t in s] for s in sentences]
+
+  def process(self, texts):
+    """ Return the lower-cased lemmas of each text, as 'create_vocab.process'
+    does. """
+    from create_vocab import lemmatize
+    sentences = self.sentences(texts)
+    self.tagger.predict(sentences, mini_batch_size=self.batch_size)
+    return [lemmatize(sentence, self.lemmatizer) for sentence in sentences]
+
+
+class NLPClient:
+  def __init__(self, address=address, key_file=key_file):
+    with open(key_file, 'rb') as f:
+      authkey = f.read()
+    self.conn = Client(address, authkey=authkey)
+
+  def request(self, method, texts):
+    self.conn.send((method, list(texts)))
+    status, result = self.conn.recv()
+    if status == 'error':
+      raise RuntimeError(result)
+    return result
+
+  def tokenize(self, texts):
+    return self.request('tokenize', texts)
+
+  def tag(self, texts):
+    return self.request('tag', texts)
+
+  def process(self, texts):
+    return self.request('process', texts)
+
+  def process_text(self, text):
+    return self.process([text])[0]
+
+  def tokenize_text(self, text):
+    return self.tokenize([text])[0]
+
+  def close(self):
+    self.conn.close()
+
+
+if __name__ == '__main__':
+  logging.basicConfig(
+    filename='logs/nlp_worker.log',
+    format='%(asctime)s %(message)s',
+    level=logging.INFO
+  )
+  NLPWorker().serve()
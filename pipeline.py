@@ -0,0 +1,426 @@
+""" Run the processing pipeline as a set of stages. Each stage declares the
+files it reads, the files it writes and the parameters it is called with. The
+runner fingerprints the inputs and parameters of each stage and skips it if its
+outputs exist and the fingerprint matches the one stored after its last run.
+Stages whose dependencies are satisfied run concurrently, e.g. the venues, the
+references and the vocab do not depend on each other.
+
+The fingerprints are stored in 'data/pipeline_state.json', along with the
+parameters each stage was last run with. To avoid re-hashing the whole XML
+dump on every run, file hashes are cached with the size and modification time
+of the file they belong to.
+
+Run 'python pipeline.py' to bring all artifacts up to date, or name the stages
+that should be brought up to date, e.g. 'python pipeline.py filter'. Parameters
+can be overridden from the command line, e.g. '--param filter.top=500'; only
+the filtering and its downstream stages are then recomputed. The vocab can be
+built with spaCy instead of flair with '--param vocab.backend=spacy', on as
+many processes as given by 'vocab.n_process'. """
+
+
+import os
+import json
+import hashlib
+import logging
+import argparse
+from time import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import storage
+
+
+repos = ['depositonce', 'edoc', 'refubium']
+state_file = 'data/pipeline_state.json'
+
+
+class Stage:
+  def __init__(self, name, func, inputs, outputs, params=None, untracked=()):
+    """ 'func' is a module-level function that is called with the parameters
+    as keyword arguments. 'inputs' and 'outputs' are lists of file or folder
+    paths. The 'untracked' parameters do not change the outputs, e.g. the
+    number of processes, and are left out of the fingerprint. """
+    self.name = name
+    self.func = func
+    self.inputs = inputs
+    self.outputs = outputs
+    self.params = params if params is not None else {}
+    self.untracked = untracked
+
+
+def save_data(dump_file):
+  from load_data import save_data
+  save_data(dump_file)
+
+
+def get_venues():
+  from publication_venues import get_venues
+  get_venues()
+
+
+def cluster_venues(threshold):
+  from venue_clusters import dump_venue_clusters
+  dump_venue_clusters(threshold=threshold)
+
+
+def extract_refs():
+  from extract_references import extract_refs, get_didl_pdf, get_xoai_pdf
+  extract_refs({
+    'depositonce': get_didl_pdf,
+    'edoc': get_didl_pdf,
+    'refubium': get_xoai_pdf
+  })
+
+
+def relate_docs():
+  from relate_references import relate_docs
+  relate_docs()
+
+
+def create_vocab(data_file, dump_file, model, tagger, max_ngrams,
+    index_file=None, backend='flair', n_process=1):
+  """ Create the vocab of the data file and dump it. If 'index_file' is
+  given, the inverted index of the entries is dumped with that root name.
+  The texts are processed in batches by the backend, see 'nlp_backends', as
+  in the comparison of the backends; spaCy runs on 'n_process' processes. """
+  from inverted_index import InvertedIndex
+  from create_vocab import create_vocab_batched
+  data = storage.load_json(data_file)
+  index = InvertedIndex() if index_file is not None else None
+  vocab = create_vocab_batched(
+    data, vocab_backend(backend, model, tagger, n_process), max_ngrams, index
+  )
+  storage.dump_json(vocab, dump_file)
+  if index is not None:
+    index.dump(index_file)
+
+
+def vocab_backend(backend, model, tagger, n_process):
+  """ Return the NLP backend used to create the vocab. 'tagger' is only
+  used by flair and 'n_process' only by spaCy. """
+  from nlp_backends import get_backend
+  if backend == 'flair':
+    return get_backend(backend, model=model, tagger=tagger)
+  elif backend == 'spacy':
+    return get_backend(backend, model=model, n_process=n_process)
+  return get_backend(backend, model=model)
+
+
+def filter_vocab(vocab_file, bottom, top):
+  from filter_vocab import VocabFilterer
+  VocabFilterer(vocab_file, bottom, top).filter()
+
+
+def remove_ngrams(vocab_file, dump_file):
+  from create_vocab import remove_ngrams
+  remove_ngrams(vocab_file, dump_file)
+
+
+def process_data(data_file, dump_file, model, tagger):
+  from process_data import DataProcessor, load_models
+  data = storage.load_json(data_file)
+  processor = DataProcessor(*load_models(model, tagger))
+  processor.process_data(data, processor.process_text, dump_file)
+
+
+def export_matrix(vocab_file, data_file, root, max_ngrams):
+  from doc_term_matrix import export
+  export(vocab_file, data_file, root, max_ngrams)
+
+
+def vocab_steps(root):
+  """ Return the files dumped by the VocabFilterer for the given root. """
+  files = []
+  for step in range(1, 5):
+    files += [f'{root}_step_{step}.json', f'{root}_step_{step}_removed.json']
+  return files
+
+
+stages = [
+  Stage(
+    'data', save_data,
+    inputs=['data/xml/dim'] + [
+      f'data/json/dim/{repo}/relevant_ids.json' for repo in repos
+    ],
+    outputs=['data/json/dim/all/data.json'],
+    params={'dump_file': 'data/json/dim/all/data.json'}
+  ),
+  Stage(
+    'venues', get_venues,
+    inputs=['data/xml/dim'] + [
+      f'data/json/dim/{repo}/relevant_types.json' for repo in repos
+    ],
+    outputs=['data/json/dim/all/relevant_venues.json']
+  ),
+  Stage(
+    'venue_clusters', cluster_venues,
+    inputs=['data/json/dim/all/relevant_venues.json'],
+    outputs=[
+      'data/json/dim/all/venue_ids.json', 'data/json/dim/all/venue_table.json'
+    ],
+    params={'threshold': 0.8}
+  ),
+  Stage(
+    'references', extract_refs,
+    inputs=[f'data/json/dim/{repo}/relevant_ids.json' for repo in repos],
+    outputs=[f'data/json/references/{repo}.json' for repo in repos]
+  ),
+  Stage(
+    'relations', relate_docs,
+    inputs=['data/json/dim/all/improved_data.json'] + [
+      f'data/json/references/{repo}.json' for repo in repos
+    ],
+    outputs=['data/json/references/relations.json']
+  ),
+  Stage(
+    'vocab', create_vocab,
+    inputs=['data/json/dim/all/data.json'],
+    outputs=[
+      'data/vocab/repo_vocab.json',
+      'data/vocab/repo_index.json',
+      'data/vocab/repo_index.bin'
+    ],
+    params={
+      'data_file': 'data/json/dim/all/data.json',
+      'dump_file': 'data/vocab/repo_vocab.json',
+      'model': 'en_core_web_sm',
+      'tagger': 'upos-fast',
+      'max_ngrams': 4,
+      'index_file': 'data/vocab/repo_index',
+      'backend': 'flair',
+      'n_process': 4
+    },
+    untracked=['n_process']
+  ),
+  Stage(
+    'filter', filter_vocab,
+    inputs=['data/vocab/repo_vocab.json'],
+    outputs=vocab_steps('data/vocab/repo_vocab'),
+    params={
+      'vocab_file': 'data/vocab/repo_vocab.json', 'bottom': 1, 'top': 1000
+    }
+  ),
+  Stage(
+    '1grams', remove_ngrams,
+    inputs=['data/vocab/repo_vocab_step_1.json'],
+    outputs=['data/vocab/repo_vocab_1grams.json'],
+    params={
+      'vocab_file': 'data/vocab/repo_vocab_step_1.json',
+      'dump_file': 'data/vocab/repo_vocab_1grams.json'
+    }
+  ),
+  Stage(
+    'lemmas', process_data,
+    inputs=['data/json/dim/all/improved_data.json'],
+    outputs=['data/json/dim/all/data_lemmas.json'],
+    params={
+      'data_file': 'data/json/dim/all/improved_data.json',
+      'dump_file': 'data/json/dim/all/data_lemmas.json',
+      'model': 'en_core_web_sm',
+      'tagger': 'upos-fast'
+    }
+  ),
+  Stage(
+    'matrix', export_matrix,
+    inputs=[
+      'data/vocab/repo_vocab_step_4.json', 'data/json/dim/all/data_lemmas.json'
+    ],
+    outputs=[
+      f'data/vocab/doc_term_{kind}.{ext}'
+      for kind in ('counts', 'tfidf') for ext in ('npz', 'json')
+    ],
+    params={
+      'vocab_file': 'data/vocab/repo_vocab_step_4.json',
+      'data_file': 'data/json/dim/all/data_lemmas.json',
+      'root': 'data/vocab/doc_term',
+      'max_ngrams': 4
+    }
+  ),
+]
+
+
+class Runner:
+  def __init__(self, stages, state_file=state_file, workers=None):
+    self.stages = {stage.name: stage for stage in stages}
+    self.state_file = state_file
+    self.workers = workers
+    self.producers = {}  # maps each output to the stage that creates it.
+    for stage in stages:
+      for output in stage.outputs:
+        self.producers[output] = stage.name
+    if os.path.exists(state_file):
+      self.state = json.load(open(state_file))
+    else:
+      self.state = {'files': {}, 'stages': {}}
+    self.state.setdefault('params', {})
+
+  def dependencies(self, name):
+    """ Return the names of the stages that produce the inputs of the given
+    stage. """
+    return {
+      self.producers[path] for path in self.stages[name].inputs
+      if path in self.producers
+    }
+
+  def required(self, targets):
+    """ Return the names of the given stages and of all their upstream
+    stages. """
+    required, todo = set(), list(targets)
+    while len(todo) > 0:
+      name = todo.pop()
+      if name not in self.stages:
+        raise ValueError(f'Unknown stage "{name}".')
+      if name not in required:
+        required.add(name)
+        todo += self.dependencies(name)
+    return required
+
+  def hash_file(self, path):
+    """ Return the SHA-1 of the file. The hash is reused as long as the size
+    and the modification time of the file have not changed. """
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime_ns]
+    cached = self.state['files'].get(path)
+    if cached is not None and cached['stat'] == key:
+      return cached['hash']
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+      for chunk in iter(lambda: f.read(1 << 20), b''):
+        sha.update(chunk)
+    self.state['files'][path] = {'stat': key, 'hash': sha.hexdigest()}
+    return sha.hexdigest()
+
+  def hash_path(self, path):
+    """ Return the hash of a file, as stored by the storage module, or of all
+    the files in a folder. Missing paths are hashed as None. """
+    if os.path.isdir(path):
+      sha = hashlib.sha1()
+      for folder, dirs, files in sorted(os.walk(path)):
+        dirs.sort()
+        for filename in sorted(files):
+          file = os.path.join(folder, filename)
+          sha.update(f'{file}:{self.hash_file(file)}'.encode('utf-8'))
+      return sha.hexdigest()
+    stored = storage.resolve(path)
+    if stored is not None:
+      return self.hash_file(stored)
+    return None
+
+  def fingerprint(self, name):
+    """ Return the fingerprint of the stage, computed from its function, its
+    parameters and the contents of its inputs. The function is identified by
+    its name only, as its module is '__main__' when the pipeline is run as a
+    script and 'pipeline' when it is imported, e.g. by the harvest. """
+    stage = self.stages[name]
+    description = {
+      'func': stage.func.__name__,
+      'params': {
+        k: v for k, v in stage.params.items() if k not in stage.untracked
+      },
+      'inputs': {path: self.hash_path(path) for path in stage.inputs}
+    }
+    return hashlib.sha1(
+      json.dumps(description, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+  def up_to_date(self, name, fingerprint):
+    """ A stage is up to date if all its outputs exist and its fingerprint
+    has not changed since its last run. """
+    if not all(storage.exists(path) for path in self.stages[name].outputs):
+      return False
+    return self.state['stages'].get(name) == fingerprint
+
+  def mark_done(self, names):
+    """ Store the current fingerprints of the given stages, e.g. after their
+    outputs were updated in place by the incremental harvest. """
+    for name in names:
+      self.state['stages'][name] = self.fingerprint(name)
+      self.state['params'][name] = self.stages[name].params
+    self.dump_state()
+
+  def last_params(self, name):
+    """ Return a copy of the parameters the stage was last run with, or of
+    its current ones if it was never run. """
+    return dict(self.state['params'].get(name, self.stages[name].params))
+
+  def dump_state(self):
+    json.dump(self.state, open(self.state_file, 'w'), indent=2)
+
+  def run(self, targets=None, force=(), dry_run=False):
+    """ Bring the given stages and their upstream stages up to date. Stages in
+    'force' are run even if they are up to date. Stages are started as soon as
+    all their dependencies are done. Return the names of the stages that
+    were run, or would be run if 'dry_run' is True. """
+    todo = self.required(targets if targets else self.stages)
+    done, executed, running = set(), [], {}
+    with ProcessPoolExecutor(self.workers) as executor:
+      while len(todo) > 0 or len(running) > 0:
+        ready = [n for n in todo if self.dependencies(n) <= done]
+        for name in sorted(ready):
+          todo.remove(name)
+          fingerprint = self.fingerprint(name)
+          stale = name in force or not self.up_to_date(name, fingerprint)
+          if dry_run:  # upstream stages were not run, their outputs are old.
+            stale = stale or len(self.dependencies(name) & set(executed)) > 0
+          if not stale:
+            logging.info(f'Stage "{name}" is up to date.')
+            done.add(name)
+          elif dry_run:
+            logging.info(f'Stage "{name}" would be run.')
+            executed.append(name)
+            done.add(name)
+          else:
+            logging.info(f'Starting stage "{name}".')
+            stage = self.stages[name]
+            future = executor.submit(stage.func, **stage.params)
+            # the inputs may change while the stage runs, e.g. during a
+            # harvest; the fingerprint of the inputs it read is stored.
+            running[future] = (name, fingerprint)
+        if len(running) == 0:
+          continue
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+          name, fingerprint = running.pop(future)
+          future.result()  # raises the exception of the stage, if any.
+          self.state['stages'][name] = fingerprint
+          self.state['params'][name] = self.stages[name].params
+          self.dump_state()
+          logging.info(f'Finished stage "{name}".')
+          executed.append(name)
+          done.add(name)
+    self.dump_state()
+    return executed
+
+
+def parse_param(param):
+  """ Parse a parameter of the form 'stage.key=value'. The value is parsed
+  as JSON if possible and kept as a string otherwise. """
+  key, value = param.split('=', 1)
+  name, key = key.split('.', 1)
+  try:
+    value = json.loads(value)
+  except json.JSONDecodeError:
+    pass
+  return name, key, value
+
+
+if __name__ == '__main__':
+  logging.basicConfig(
+    filename=f'logs/pipeline_{int(time())}.log',
+    format='%(asctime)s %(message)s',
+    level=logging.INFO
+  )
+  arg_parser = argparse.ArgumentParser(description=__doc__)
+  arg_parser.add_argument(
+    'targets', nargs='*', help='stages to bring up to date'
+  )
+  arg_parser.add_argument('--param', action='append', default=[])
+  arg_parser.add_argument('--force', action='append', default=[])
+  arg_parser.add_argument('--workers', type=int, default=None)
+  arg_parser.add_argument('--dry-run', action='store_true')
+  args = arg_parser.parse_args()
+  runner = Runner(stages, workers=args.workers)
+  for param in args.param:
+    name, key, value = parse_param(param)
+    runner.stages[name].params[key] = value
+  executed = runner.run(args.targets, set(args.force), args.dry_run)
+  print(f'Executed stages: {", ".join(executed) if executed else "none"}')
@@ -1,16 +1,10 @@
 """ Process the file 'relevant_data.json', created by running the script
 'retrieve_relevant_data.py' of the 'repository_analysis' repo. The processing
 procedure is the same as for the vocabulary, to enable the comparison among
-both sources. """
+both sources. The models are imported when they are needed. """
 
 
-import json
-
-from flair.data import Sentence
-from flair.tokenization import SpacyTokenizer
-from flair.models import SequenceTagger
-from nltk.stem import WordNetLemmatizer
-
+import storage
 from create_vocab import process
 
 
@@ -29,40 +23,44 @@ class DataProcessor:
           processed[id][text] = func(metadata[text])
         else:
           processed[id][text] = None
-    json.dump(processed, open(dump_file, 'w'))
+    storage.dump_json(processed, dump_file)
 
   def process_text(self, text):
+    from flair.data import Sentence
     return process(
       Sentence(text, use_tokenizer=self.tokenizer),
       self.tagger, self.lemmatizer
     )
 
   def tokenize_text(self, text):
+    from flair.data import Sentence
     tokens = Sentence(text, use_tokenizer=self.tokenizer)
     return [token.text for token in tokens]
 
 
-def process_subjects():
-  tokenizer = SpacyTokenizer('en_core_web_sm')
-  lemmatizer = WordNetLemmatizer()
-  tagger = SequenceTagger.load('upos-fast')
-  processor = DataProcessor(tokenizer, tagger, lemmatizer)
-  subjects = json.load(open('data/openalex/articles.json', encoding='utf-8'))
+def load_models(model='en_core_web_sm', tagger='upos-fast'):
+  """ Return the tokenizer, the tagger and the lemmatizer. """
+  from flair.tokenization import SpacyTokenizer
+  from flair.models import SequenceTagger
+  from nltk.stem import WordNetLemmatizer
+  return SpacyTokenizer(model), SequenceTagger.load(tagger), WordNetLemmatizer()
+
+
+def process_subjects(processor=None):
+  """ Process the articles of the subjects. If no processor is given, the
+  models are loaded; a client of the NLP worker can be passed instead. """
+  if processor is None:
+    processor = DataProcessor(*load_models())
+  subjects = storage.load_json('data/openalex/articles.json')
   articles = {}
   for subject, article in subjects.items():
     articles[subject] = processor.process_text(article)
   print('Done')
-  json.dump(
-    articles,
-    open('data/openalex/articles_processed.json', 'w', encoding='utf-8')
-  )
+  storage.dump_json(articles, 'data/openalex/articles_processed.json')
 
 
 if __name__ == '__main__':
-  data = json.load(open('data/json/dim/all/improved_data.json'))
-  tokenizer = SpacyTokenizer('en_core_web_sm')
-  lemmatizer = WordNetLemmatizer()
-  tagger = SequenceTagger.load('upos-fast')
-  processor = DataProcessor(tokenizer, tagger, lemmatizer)
+  data = storage.load_json('data/json/dim/all/improved_data.json')
+  processor = DataProcessor(*load_models())
   # processor.process_data(data, processor.process_text, 'data/json/dim/all/data_lemmas.json')
-  process_subjects()
+  process_subjects(processor)
@@ -1,9 +1,8 @@
 """ Retrieve the publishing venue of each publication. """
 
 
-from xml.etree import ElementTree as ET
-import json
-import os
+import storage
+from load_data import DataLoader
 
 
 oai = '{http://www.openarchives.org/OAI/2.0/}'
@@ -15,23 +14,16 @@ dim = '{http://www.dspace.org/xmlns/dspace/dim}'
 
 def get_record(id, repo):
   """ Retrieve a record given its ID and the folder with the XML files it is
-  included in. """
-  folder = f'data/xml/dim/{repo}'
-  for filename in os.listdir(folder):
-    root = ET.parse(f'{folder}/{filename}').getroot()
-    for record in root.find(f'{oai}ListRecords'):
-      header = record.find(f'{oai}header')
-      try:
-        this_id = header.find(f'{oai}identifier').text
-        if this_id == id:
-          return record
-      except AttributeError:
-        continue
+  included in. If the record was harvested several times, its latest version
+  is returned, or None if it was deleted. """
+  loader = DataLoader()
+  return loader.latest_records(loader.files(repo), [id]).get(id)
 
 
-def get_venue(id, publication_type, repo):
+def get_venue(id, publication_type, repo, record=None):
   """ Return the venue included in the given record. The venue type differs
-  depending on the publication type. """
+  depending on the publication type. If the record is not given, it is
+  retrieved with 'get_record'. """
   if repo == 'edoc':
     qualifier = 'container-title'
   else:
@@ -41,7 +33,10 @@ def get_venue(id, publication_type, repo):
       qualifier = 'proceedingstitle'
     else:
       qualifier = 'journaltitle'
-  record = get_record(id, repo)
+  if record is None:
+    record = get_record(id, repo)
+  if record is None:
+    return None
   metadata = record.find(f'{oai}metadata')
   if metadata is None:
     return None
@@ -72,12 +67,18 @@ def get_venues():
   """ Return a mapping of IDs to venues. 'relevant_types' is a mapping of IDs
   to publication types. Theses don't have venues and are thus not included. """
   mapping = dict()
+  loader = DataLoader()
   for repo in ['depositonce', 'edoc', 'refubium']:
-    relevant_types = json.load(open(f'data/json/dim/{repo}/relevant_types.json'))
+    relevant_types = storage.load_json(f'data/json/dim/{repo}/relevant_types.json')
+    records = loader.latest_records(loader.files(repo), relevant_types)
     for id, doc_type in relevant_types.items():
       if 'thesis' not in doc_type:
-        mapping[id] = get_venue(id, doc_type, repo)
-  json.dump(mapping, open(f'data/json/dim/all/relevant_venues.json', 'w'))
+        record = records.get(id)
+        if record is None:  # deleted
+          mapping[id] = None
+        else:
+          mapping[id] = get_venue(id, doc_type, repo, record)
+  storage.dump_json(mapping, f'data/json/dim/all/relevant_venues.json')
 
 
 def discover_fields():
@@ -85,28 +86,28 @@ def discover_fields():
   'bibliographicCitation' as element. This is important to know which
   qualifiers to look at when searching for the venue of a publication. """
   fields = {'depositonce': {}, 'edoc': {}, 'refubium': {}}
+  loader = DataLoader()
   for repo in fields:
-    folder = f'data/xml/dim/{repo}'
-    for filename in os.listdir(folder):
-      root = ET.parse(f'{folder}/{filename}').getroot()
-      for record in root.find(f'{oai}ListRecords'):
-        qualifiers = []
-        metadata = record.find(f'{oai}metadata')
-        if metadata is None:
-          continue
-        for f in metadata.find(f'{dim}dim').findall(f'{dim}field'):
-          if 'element' in f.attrib and \
-              f.attrib['element'] == 'bibliographicCitation':
-            if 'qualifier' in f.attrib:
-              qualifiers.append(f.attrib['qualifier'])
-          elif 'element' in f.attrib and 'qualifier' not in f.attrib \
-              and f.attrib['element'] == 'type':
-            doc_type = f.text
-        if doc_type in fields[repo]:
-          fields[repo][doc_type] = list(set(fields[repo][doc_type] + qualifiers))
-        else:
-          fields[repo][doc_type] = qualifiers
-  json.dump(fields, open('data/json/dim/all/citation_qualifiers.json', 'w'))
+    for record in loader.latest_records(loader.files(repo)).values():
+      if record is None:
+        continue
+      qualifiers = []
+      metadata = record.find(f'{oai}metadata')
+      if metadata is None:
+        continue
+      for f in metadata.find(f'{dim}dim').findall(f'{dim}field'):
+        if 'element' in f.attrib and \
+            f.attrib['element'] == 'bibliographicCitation':
+          if 'qualifier' in f.attrib:
+            qualifiers.append(f.attrib['qualifier'])
+        elif 'element' in f.attrib and 'qualifier' not in f.attrib \
+            and f.attrib['element'] == 'type':
+          doc_type = f.text
+      if doc_type in fields[repo]:
+        fields[repo][doc_type] = list(set(fields[repo][doc_type] + qualifiers))
+      else:
+        fields[repo][doc_type] = qualifiers
+  storage.dump_json(fields, 'data/json/dim/all/citation_qualifiers.json')
 
 
 def test_venues():
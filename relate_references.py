@@ -1,14 +1,14 @@
 """ Store references between documents of our corpus as lists of IDs. """
 
 
-import json
+import storage
 
 
 def relate_docs():
   relations = {}
-  data = json.load(open('data/json/dim/all/improved_data.json'))
+  data = storage.load_json('data/json/dim/all/improved_data.json')
   for repo in ('depositonce', 'edoc', 'refubium'):
-    refs = json.load(open(f'data/json/references/{repo}.json'))
+    refs = storage.load_json(f'data/json/references/{repo}.json')
     for id in refs.keys():
       relations[id] = []
       for ref in refs[id]:
@@ -17,7 +17,7 @@ def relate_docs():
             continue
           if data[doc_id]['title'] in ref['raw_ref']:
             relations[id].append(doc_id)
-            json.dump(relations, open('data/json/references/relations.json', 'w'))
+            storage.dump_json(relations, 'data/json/references/relations.json')
 
 
 if __name__ == '__main__':
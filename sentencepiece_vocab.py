@@ -3,10 +3,11 @@ one of SciBERT. SciVOCAB has 30k terms, same as BERT. SciBERT is only trained
 on 18 % computer science and 82 % biomedical papers (1.14M in total). """
 
 
-import json
 import sentencepiece as spm
 from nltk import sent_tokenize
 
+import storage
+
 
 def create_input():
   """ Input of the trainer must be a TXT file with one sentence of raw text
@@ -18,10 +19,7 @@ def create_input():
 
 def load_data():
   """ Lazy load the sentences of all titles and abstracts. """
-  all_data = json.load(open(
-    'data/json/dim/all/relevant_data.json',
-    encoding='utf-8'
-  ))
+  all_data = storage.load_json('data/json/dim/all/relevant_data.json')
   for data in all_data.values():
     for text in data.values():
       if text is not None:
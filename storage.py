@@ -0,0 +1,288 @@
+""" Read and write the data files, i.e. the harvested XML pages and the JSON
+files, through a streaming compressor. Files are referred to by their plain
+name, e.g. 'data/vocab/repo_vocab.json'; on disk, the file may be stored as is
+or compressed, as 'repo_vocab.json.zst' (zstandard) or 'repo_vocab.json.gz'.
+Readers find whichever exists. Writers compress with zstandard if it is
+installed and write plain files otherwise. They write to a temporary file that
+replaces the stored one once it is complete, and then remove the other versions
+of the file so that no stale copy is read. Large JSON objects can be read item by
+item with 'iter_json_items'.
+
+The many small XML pages of a folder can also be packed into a single
+archive, e.g. 'data/xml/dim/edoc' into 'data/xml/dim/edoc.pack'. Each page is
+compressed on its own and an index with the offset and size of each page is
+stored in 'edoc.pack.json', so that any page can be read with a single seek.
+Packed pages are listed and read as if they were in the folder. """
+
+
+import io
+import os
+import gzip
+import json
+from contextlib import contextmanager
+from xml.etree import ElementTree as ET
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+
+level = 3  # zstandard compression level; low levels are the fastest.
+suffixes = ('', '.zst', '.gz')
+
+
+def resolve(path):
+  """ Return the path under which the file is stored, or None if it does not
+  exist. Packed files are resolved to their archive. """
+  for suffix in suffixes:
+    if os.path.exists(path + suffix):
+      return path + suffix
+  folder, name = os.path.split(path)
+  if name in pack_index(folder).get('members', {}):
+    return f'{folder}.pack'
+  return None
+
+
+def exists(path):
+  return resolve(path) is not None
+
+
+def open_file(path, mode='r', encoding='utf-8'):
+  """ Open the file for reading ('r', 'rb') or writing ('w', 'wb'). Files
+  opened for writing must be used in a 'with' statement. """
+  binary = 'b' in mode
+  if mode.startswith('w'):
+    return open_writer(path, binary, encoding)
+  f = open_reader(path)
+  return f if binary else io.TextIOWrapper(f, encoding=encoding)
+
+
+def open_reader(path):
+  stored = resolve(path)
+  if stored is None:
+    raise FileNotFoundError(path)
+  elif stored.endswith('.pack'):
+    return io.BytesIO(read_member(*os.path.split(path)))
+  elif stored.endswith('.zst'):
+    if zstandard is None:
+      raise ImportError(f'zstandard is needed to read {stored}.')
+    return zstandard.ZstdDecompressor().stream_reader(open(stored, 'rb'))
+  elif stored.endswith('.gz'):
+    return gzip.open(stored, 'rb')
+  return open(stored, 'rb')
+
+
+@contextmanager
+def open_writer(path, binary, encoding):
+  """ Write to a temporary file, which replaces the stored file only once it
+  is complete. The other versions of the file are removed afterwards, so that
+  an interrupted write leaves the previous version intact. """
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  stored = path + '.zst' if zstandard is not None else path
+  tmp = f'{stored}.tmp'
+  try:
+    with open(tmp, 'wb') as raw:
+      f = raw
+      if zstandard is not None:
+        f = zstandard.ZstdCompressor(level=level).stream_writer(raw)
+      if not binary:
+        f = io.TextIOWrapper(f, encoding=encoding)
+      yield f
+      f.close()
+    os.replace(tmp, stored)
+  except BaseException:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    raise
+  for suffix in suffixes:
+    if path + suffix != stored and os.path.exists(path + suffix):
+      os.remove(path + suffix)
+
+
+def load_json(path):
+  with open_file(path) as f:
+    return json.load(f)
+
+
+def iter_json_items(path, block_size=1 << 20):
+  """ Yield the key-value pairs of the JSON object stored in the file without
+  loading the whole object, e.g. the processed data, which maps the IDs to
+  their lemmas. """
+  with open_file(path) as f:
+    yield from JSONItemReader(f, block_size)
+
+
+class JSONItemReader:
+  """ Iterate over the items of the JSON object in a text file. The file is
+  read in blocks and each value is decoded as soon as it is complete. """
+  def __init__(self, file, block_size=1 << 20):
+    self.file = file
+    self.block_size = block_size
+    self.decoder = json.JSONDecoder()
+    self.buffer, self.pos, self.eof = '', 0, False
+
+  def __iter__(self):
+    self.next_char('{')
+    if self.next_char('}"') == '}':
+      return
+    while True:
+      self.pos -= 1  # the key starts with the quote.
+      key = self.next_value()
+      self.next_char(':')
+      yield key, self.next_value()
+      if self.next_char(',}') == '}':
+        return
+      self.next_char('"')
+
+  def read(self):
+    """ Append a block to the unread part of the buffer. """
+    block = self.file.read(self.block_size)
+    self.eof = len(block) == 0
+    self.buffer = self.buffer[self.pos:] + block
+    self.pos = 0
+
+  def skip_spaces(self):
+    while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+      self.pos += 1
+
+  def next_char(self, chars):
+    """ Consume the next non-space character, which must be in 'chars'. """
+    while True:
+      self.skip_spaces()
+      if self.pos < len(self.buffer):
+        char = self.buffer[self.pos]
+        if char not in chars:
+          raise ValueError(f'Expected one of "{chars}", found "{char}".')
+        self.pos += 1
+        return char
+      if self.eof:
+        raise ValueError('Unexpected end of the JSON object.')
+      self.read()
+
+  def next_value(self):
+    """ Decode the next value. It is only accepted if it is followed by a
+    character that cannot continue it, so that a value cut off at the end of
+    the buffer is not mistaken for a complete one. """
+    while True:
+      self.skip_spaces()
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        if self.eof or (
+          end < len(self.buffer) and self.buffer[end] not in '+-.0123456789eE'
+        ):
+          self.pos = end
+          return value
+      except json.JSONDecodeError:
+        if self.eof:
+          raise
+      self.read()
+
+
+def dump_json(obj, path, **kwargs):
+  with open_file(path, 'w') as f:
+    json.dump(obj, f, **kwargs)
+
+
+def parse_xml(path):
+  """ Return the parsed XML file as an ElementTree. """
+  with open_file(path, 'rb') as f:
+    return ET.parse(f)
+
+
+def write_bytes(path, content):
+  with open_file(path, 'wb') as f:
+    f.write(content)
+
+
+def list_files(folder):
+  """ Return the sorted names of the files in the folder and in its archive,
+  without the compression suffixes. """
+  names = set(pack_index(folder).get('members', {}))
+  if os.path.isdir(folder):
+    names.update(strip_suffix(name) for name in os.listdir(folder))
+  return sorted(names)
+
+
+def strip_suffix(name):
+  """ Remove the compression suffix from the file name, if any. """
+  for suffix in suffixes[1:]:
+    if name.endswith(suffix):
+      return name[:-len(suffix)]
+  return name
+
+
+pack_indices = {}  # caches the indices of the archives by path and mtime.
+
+
+def pack_index(folder):
+  """ Return the index of the folder's archive, or an empty dict if there is
+  none. """
+  index_file = f'{folder}.pack.json'
+  if not os.path.exists(index_file):
+    return {}
+  key = (index_file, os.stat(index_file).st_mtime_ns)
+  if key not in pack_indices:
+    pack_indices[key] = json.load(open(index_file, encoding='utf-8'))
+  return pack_indices[key]
+
+
+def read_member(folder, name):
+  """ Return the decompressed content of a file of the folder's archive. """
+  index = pack_index(folder)
+  offset, size = index['members'][name]
+  with open(f'{folder}.pack', 'rb') as f:
+    f.seek(offset)
+    content = f.read(size)
+  if index['compression'] == 'zstd':
+    if zstandard is None:
+      raise ImportError(f'zstandard is needed to read {folder}.pack.')
+    return zstandard.ZstdDecompressor().decompress(content)
+  return content
+
+
+def pack(folder, remove=False):
+  """ Pack the files of the folder into its archive, appending them to the
+  existing one. If 'remove' is True, the packed files are deleted. """
+  index = pack_index(folder) or {
+    'compression': 'zstd' if zstandard is not None else None, 'members': {}
+  }
+  compress = index['compression'] == 'zstd'
+  if compress and zstandard is None:
+    raise ImportError(f'zstandard is needed to append to {folder}.pack.')
+  compressor = zstandard.ZstdCompressor(level=level) if compress else None
+  filenames = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+  packed = []
+  with open(f'{folder}.pack', 'ab') as archive:
+    for name in sorted({strip_suffix(filename) for filename in filenames}):
+      with open_file(f'{folder}/{name}', 'rb') as f:
+        content = f.read()
+      if compress:
+        content = compressor.compress(content)
+      index['members'][name] = [archive.tell(), len(content)]
+      archive.write(content)
+      packed.append(name)
+  with open(f'{folder}.pack.json', 'w', encoding='utf-8') as f:
+    json.dump(index, f)
+  if remove:
+    for filename in filenames:
+      os.remove(f'{folder}/{filename}')
+  return packed
+
+
+def compress_folder(folder, extension='.json'):
+  """ Compress the plain files with the given extension in the folder and its
+  subfolders. """
+  for root, _, filenames in os.walk(folder):
+    for filename in filenames:
+      if filename.endswith(extension):
+        with open(f'{root}/{filename}', 'rb') as f:
+          content = f.read()
+        write_bytes(f'{root}/{filename}', content)
+
+
+if __name__ == '__main__':
+  for repo in ('depositonce', 'edoc', 'refubium'):
+    pack(f'data/xml/dim/{repo}', remove=True)
+  compress_folder('data/json')
+  compress_folder('data/vocab')
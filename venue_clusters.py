@@ -0,0 +1,173 @@
+""" Group the venues retrieved by 'publication_venues.get_venues' that refer to
+the same journal, conference or series. The venues are strings taken from
+different fields, so the same venue is often written in several ways, e.g.
+'PLoS ONE', 'PLOS One' or 'Plos one (2019)'.
+
+1. Each distinct venue string is normalised: accents, case, punctuation,
+  years and volume or issue numbers are removed, common abbreviations are
+  expanded and stopwords are dropped. Venues with the same normalised string
+  are merged right away.
+2. The remaining venues are clustered by the Jaccard similarity of their
+  tokens. Instead of comparing all pairs, prefix filtering is used as a
+  blocking step: the tokens of each venue are sorted by increasing frequency,
+  and only venues that share one of the first tokens of their sorted lists
+  can reach the similarity threshold. Only these candidate pairs are
+  compared, and similar venues are merged with a union-find structure.
+
+Each cluster is named after its most frequent variant among those with the
+cluster's most frequent normalised string, preferring the shortest one, as
+longer variants tend to include years or volumes. The result is a mapping of
+each document to the ID of its venue cluster and a table with the name, the
+normalised string, the variants and the number of documents of each
+cluster. """
+
+
+import re
+import logging
+import unicodedata
+from math import ceil
+from collections import Counter
+
+import storage
+
+
+abbreviations = {
+  'j': 'journal', 'jour': 'journal', 'proc': 'proceedings',
+  'int': 'international', 'intl': 'international', 'conf': 'conference',
+  'symp': 'symposium', 'trans': 'transactions', 'rev': 'review',
+  'lett': 'letters', 'rep': 'reports', 'res': 'research', 'sci': 'science',
+  'univ': 'university',
+  'z': 'zeitschrift', 'ztschr': 'zeitschrift'
+}
+stopwords = {
+  'the', 'of', 'and', 'on', 'in', 'for', 'an', 'at', 'to',
+  'der', 'die', 'das', 'und', 'fur', 'des', 'dem', 'den', 'im', 'zur', 'zum',
+  'aus', 'von', 'fuer'
+}
+numbering = {'vol', 'volume', 'no', 'nr', 'issue', 'bd', 'band', 'heft', 'h'}
+
+
+def normalise(venue):
+  """ Return the normalised tokens of the venue string. If nothing is left,
+  e.g. for a year, the lower-cased string is returned as the only token. """
+  raw = venue.strip().lower()
+  venue = unicodedata.normalize('NFKD', venue)
+  venue = ''.join(c for c in venue if not unicodedata.combining(c)).lower()
+  tokens = []
+  split = [token for token in re.split(r'[^a-z0-9]+', venue) if token != '']
+  for i, token in enumerate(split):
+    if token.isdigit() and i > 0 and split[i-1] in numbering:
+      continue
+    if token in numbering and i+1 < len(split) and split[i+1].isdigit():
+      continue
+    if re.fullmatch(r'(19|20)\d\d', token):
+      continue
+    token = abbreviations.get(token, token)
+    if token not in stopwords:
+      tokens.append(token)
+  return tokens if len(tokens) > 0 else [raw]
+
+
+class VenueClusterer:
+  def __init__(self, threshold=0.8):
+    self.threshold = threshold
+
+  def cluster(self, venues):
+    """ Return a list with the cluster number of each of the given distinct
+    venue strings. """
+    keys = [' '.join(normalise(venue)) for venue in venues]
+    distinct = sorted(set(keys))
+    self.parents = list(range(len(distinct)))
+    token_sets = [set(key.split()) for key in distinct]
+    for i, j in self.candidates(token_sets):
+      if jaccard(token_sets[i], token_sets[j]) >= self.threshold:
+        self.union(i, j)
+    numbers = {key: self.find(i) for i, key in enumerate(distinct)}
+    return [numbers[key] for key in keys]
+
+  def candidates(self, token_sets):
+    """ Yield the pairs of venues that share a token in their prefixes, i.e.
+    the tokens that must be shared to reach the threshold. The tokens are
+    sorted by increasing frequency, so that the prefixes are made of rare
+    tokens and few venues are indexed under each of them. """
+    frequencies = Counter(t for tokens in token_sets for t in tokens)
+    index = {}  # maps each token to the venues with the token in the prefix.
+    n_candidates = 0
+    for i, tokens in enumerate(token_sets):
+      if len(tokens) == 0:
+        continue
+      ordered = sorted(tokens, key=lambda t: (frequencies[t], t))
+      prefix = ordered[:len(tokens) - ceil(self.threshold * len(tokens)) + 1]
+      seen = set()
+      for token in prefix:
+        for j in index.get(token, []):
+          if j not in seen:
+            seen.add(j)
+            n_candidates += 1
+            yield j, i
+        index.setdefault(token, []).append(i)
+    logging.info(
+      f'{n_candidates} candidate pairs out of '
+      f'{len(token_sets) * (len(token_sets) - 1) // 2}.'
+    )
+
+  def find(self, i):
+    while self.parents[i] != i:
+      self.parents[i] = self.parents[self.parents[i]]
+      i = self.parents[i]
+    return i
+
+  def union(self, i, j):
+    self.parents[self.find(i)] = self.find(j)
+
+
+def jaccard(a, b):
+  return len(a & b) / len(a | b)
+
+
+def cluster_venues(venues, threshold=0.8):
+  """ Given a mapping of document IDs to venue strings, return a mapping of
+  the IDs to venue IDs (None if the document has no venue) and the table of
+  the venues. """
+  docs = Counter(v for v in venues.values() if v is not None)
+  distinct = sorted(docs)
+  keys = {venue: ' '.join(normalise(venue)) for venue in distinct}
+  clusters = VenueClusterer(threshold).cluster(distinct)
+  ids, table = {}, []
+  for cluster in sorted(set(clusters)):
+    ids[cluster] = len(table)
+    table.append({
+      'id': len(table), 'name': None, 'key': None, 'variants': [], 'docs': 0
+    })
+  for venue, cluster in zip(distinct, clusters):
+    row = table[ids[cluster]]
+    row['variants'].append(venue)
+    row['docs'] += docs[venue]
+  for row in table:
+    key_docs = Counter()
+    for venue in row['variants']:
+      key_docs[keys[venue]] += docs[venue]
+    row['key'] = min(key_docs, key=lambda k: (-key_docs[k], len(k), k))
+    row['name'] = min(
+      (v for v in row['variants'] if keys[v] == row['key']),
+      key=lambda v: (-docs[v], len(v), v)
+    )
+  venue_ids, cluster_of = {}, dict(zip(distinct, clusters))
+  for doc, venue in venues.items():
+    venue_ids[doc] = None if venue is None else ids[cluster_of[venue]]
+  logging.info(f'{len(distinct)} distinct venues in {len(table)} clusters.')
+  return venue_ids, table
+
+
+def dump_venue_clusters(venues_file='data/json/dim/all/relevant_venues.json',
+    ids_file='data/json/dim/all/venue_ids.json',
+    table_file='data/json/dim/all/venue_table.json', threshold=0.8):
+  """ Cluster the venues of the relevant documents and dump the venue ID of
+  each document and the table of the venues. """
+  venue_ids, table = cluster_venues(storage.load_json(venues_file), threshold)
+  storage.dump_json(venue_ids, ids_file)
+  storage.dump_json(table, table_file)
+
+
+if __name__ == '__main__':
+  dump_venue_clusters()
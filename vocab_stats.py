@@ -0,0 +1,202 @@
+""" Statistics of the vocab and of its filtering steps, as shown in the
+notebooks of the 'analysis' folder and the plots in 'docs/vocab'. Each vocab
+file is loaded once into NumPy arrays: the frequency of each entry, its number
+of words and, for the unfiltered vocab, the step in which it was removed (0 if
+it was kept). The arrays are cached next to the vocab file, e.g.
+'repo_vocab_step_2.json' is cached in 'repo_vocab_step_2.stats.npz', and are
+loaded again only when the vocab file or one of its step files changes. All
+statistics are then computed with vectorized operations over these arrays. """
+
+
+import os
+
+import numpy as np
+
+import storage
+
+
+steps = ['', '_step_1', '_step_2', '_step_3', '_step_4']
+step_names = ['Unfiltered', 'Step 1', 'Step 2', 'Step 3', 'Step 4']
+
+
+def load(vocab_file):
+  """ Return a dict with the arrays 'freq' and 'n_words' of the vocab. If
+  the vocab is unfiltered and its filtered steps exist, the array
+  'removed_in' is included as well. The cache is used if neither the vocab
+  nor its step files changed. """
+  root = vocab_file[:-5]
+  step_files = [f'{root}{step}.json' for step in steps[1:]]
+  source = np.array([file_stat(f) for f in [vocab_file] + step_files])
+  cache_file = f'{root}.stats.npz'
+  if os.path.exists(cache_file):
+    cached = np.load(cache_file)
+    if np.array_equal(cached['source'], source):
+      return {k: cached[k] for k in cached.files if k != 'source'}
+  vocab = storage.load_json(vocab_file)
+  arrays = {
+    'freq': np.fromiter(vocab.values(), dtype=np.int32, count=len(vocab)),
+    'n_words': np.fromiter(
+      (entry.count(' ') + 1 for entry in vocab), dtype=np.int8,
+      count=len(vocab)
+    )
+  }
+  if all(storage.exists(file) for file in step_files):
+    arrays['removed_in'] = removal_steps(vocab, step_files)
+  np.savez(cache_file, source=source, **arrays)
+  return arrays
+
+
+def file_stat(file):
+  """ Return the size and modification time of the stored file, or -1 for
+  both if it does not exist. """
+  stored = storage.resolve(file)
+  if stored is None:
+    return [-1, -1]
+  stat = os.stat(stored)
+  return [stat.st_size, stat.st_mtime_ns]
+
+
+def removal_steps(vocab, step_files):
+  """ Return the step in which each entry of the vocab was removed, or 0 if
+  it is present in the last step. """
+  removed_in = np.zeros(len(vocab), dtype=np.int8)
+  kept = np.ones(len(vocab), dtype=bool)
+  for step, file in enumerate(step_files, start=1):
+    step_vocab = storage.load_json(file)
+    in_step = np.fromiter(
+      (entry in step_vocab for entry in vocab), dtype=bool, count=len(vocab)
+    )
+    removed_in[kept & ~in_step] = step
+    kept &= in_step
+  return removed_in
+
+
+def frequency_counts(arrays, top=None):
+  """ Return the number of entries with each frequency, indexed by the
+  frequency. Frequencies from 'top' on are summed in the last element. """
+  counts = np.bincount(arrays['freq'])
+  if top is not None and len(counts) > top:
+    counts = np.append(counts[:top], counts[top:].sum())
+  return counts
+
+
+def frequency_bins(arrays, edges):
+  """ Return the number of entries whose frequency is in each bin. The bins
+  include their upper edge, e.g. the edges (0, 100, 200) define the bins
+  1-100 and 101-200. """
+  return np.histogram(arrays['freq'], bins=np.asarray(edges) + 0.5)[0]
+
+
+def words_per_entry(arrays, mask=None):
+  """ Return the number of entries with each number of words, indexed by the
+  number of words. A boolean mask selects the entries to be counted, e.g.
+  'arrays["freq"] == 1'; the result has the same length with or without it. """
+  n_words = arrays['n_words'] if mask is None else arrays['n_words'][mask]
+  length = int(arrays['n_words'].max()) + 1 if len(arrays['n_words']) else 0
+  return np.bincount(n_words, minlength=length)
+
+
+def summary(arrays):
+  """ Return the statistics of the vocab shown in the notebooks. """
+  freq, size = arrays['freq'], len(arrays['freq'])
+  return {
+    'size': size,
+    'avg_frequency': float(freq.mean()) if size > 0 else 0.,
+    'share_once': float((freq == 1).mean()) if size > 0 else 0.,
+    'share_twice': float((freq == 2).mean()) if size > 0 else 0.,
+    'words_per_entry': words_per_entry(arrays).tolist(),
+    'words_per_entry_once': words_per_entry(arrays, freq == 1).tolist()
+  }
+
+
+def step_summaries(root):
+  """ Return the summary of the unfiltered vocab and of each step, for the
+  vocab files of the given root name, e.g. 'data/vocab/repo_vocab'. """
+  return {
+    name: summary(load(f'{root}{step}.json'))
+    for name, step in zip(step_names, steps)
+    if storage.exists(f'{root}{step}.json')
+  }
+
+
+def removed_per_step(arrays):
+  """ Return a matrix with the number of entries removed in each step (rows,
+  the first being the kept entries) for each number of words (columns). """
+  n_steps, n_words = len(steps), int(arrays['n_words'].max()) + 1
+  flat = arrays['removed_in'].astype(np.int64) * n_words + arrays['n_words']
+  return np.bincount(flat, minlength=n_steps * n_words).reshape(
+    n_steps, n_words
+  )
+
+
+def plot_all(root='data/vocab/repo_vocab', folder='docs/vocab'):
+  """ Regenerate the plots of the vocab before and after filtering. """
+  from matplotlib import pyplot as plt
+  before, after = f'{folder}/before_filtering', f'{folder}/after_filtering'
+  arrays = load(f'{root}.json')
+  counts = frequency_counts(arrays, top=4)
+  plt.pie(counts[1:], labels=['1', '2', '3', '4+'])
+  plt.title('Frequency of each entry.')
+  plt.savefig(f'{before}/entry_frequency.PNG')
+  plt.close()
+  n_words = words_per_entry(arrays)
+  plt.pie(n_words[1:], labels=range(1, len(n_words)))
+  plt.title('Number of words per entry.')
+  plt.savefig(f'{before}/n_words.PNG')
+  plt.close()
+
+  summaries = step_summaries(root)
+  x = np.arange(len(summaries))
+  plt.plot(x, [s['size'] for s in summaries.values()])
+  plt.xticks(x, summaries.keys())
+  plt.ylabel('No. of entries')
+  plt.xlabel('Step')
+  plt.savefig(f'{after}/size_per_step.PNG')
+  plt.close()
+  plt.bar(x, [s['avg_frequency'] for s in summaries.values()])
+  plt.xticks(x, summaries.keys())
+  plt.ylabel('Avg. frequency')
+  plt.savefig(f'{after}/avg_frequency_per_step.PNG')
+  plt.close()
+  if 'removed_in' in arrays:
+    # the entries of each step are those kept or removed in a later step.
+    removed = removed_per_step(arrays)
+    per_step = {
+      name: (removed[0] + removed[i+1:].sum(axis=0)).tolist()
+      for i, name in enumerate(step_names)
+    }
+  else:
+    per_step = {name: s['words_per_entry'] for name, s in summaries.items()}
+  width = .8 / len(per_step)
+  for i, (name, values) in enumerate(per_step.items()):
+    values = values[1:]
+    plt.bar(np.arange(1, len(values)+1) + (i-len(per_step)/2)*width, values,
+      width, label=name)
+  plt.legend()
+  plt.xlabel('No. of words of the entry')
+  plt.ylabel('No. of entries')
+  plt.savefig(f'{after}/words_per_entry_per_step.PNG')
+  plt.close()
+
+  final = load(f'{root}{steps[-1]}.json')
+  n_words = words_per_entry(final)
+  plt.pie(n_words[1:], labels=range(1, len(n_words)))
+  plt.title('Number of words per entry.')
+  plt.savefig(f'{after}/words_per_entry.PNG')
+  plt.close()
+  edges = list(range(0, 1001, 100))
+  plt.bar(range(len(edges)-1), frequency_bins(final, edges))
+  plt.xlabel('No. of documents where the entry appears (as bins)')
+  plt.ylabel('No. of words in the bin (log. scale).')
+  plt.xticks(
+    range(len(edges)-1), [f'({top - 99} - {top})' for top in edges[1:]],
+    rotation=45
+  )
+  plt.yscale('log')
+  plt.tight_layout()
+  plt.savefig(f'{after}/entry_frequency.PNG')
+  plt.close()
+
+
+if __name__ == '__main__':
+  plot_all()